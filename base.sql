@@ -8,6 +8,23 @@ CREATE TABLE IF NOT EXISTS series (
     langue_originale VARCHAR(50)
 );
 
+-- Les slugs sont calculés uniquement côté Python (aligner_nom_bdd): l'ancienne colonne
+-- générée dépendait de la collation pour lower() et pouvait diverger. Bases déjà migrées:
+ALTER TABLE series DROP COLUMN IF EXISTS slug;
+
+-- Notifie l'API (LISTEN series_changed) à chaque modification de la table series:
+-- chaque processus reconstruit alors son mapping {slug: série} au lieu de l'expirer par TTL.
+CREATE OR REPLACE FUNCTION notifier_series_modifiees() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('series_changed', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS series_modifiees ON series;
+CREATE TRIGGER series_modifiees AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON series
+    FOR EACH STATEMENT EXECUTE FUNCTION notifier_series_modifiees();
+
 -- 2. Création de la table 'episodes'
 -- Lie chaque épisode à une série via une clé étrangère.
 CREATE TABLE IF NOT EXISTS episodes (
@@ -34,9 +51,19 @@ CREATE TABLE IF NOT EXISTS utilisateurs (
     id SERIAL PRIMARY KEY,
     pseudo VARCHAR(100),
     email VARCHAR(255) UNIQUE NOT NULL,
-    mdp_hash TEXT NOT NULL
+    mdp_hash BYTEA NOT NULL
 );
 
+-- Migration des bases créées avec mdp_hash en TEXT: le hash bcrypt est stocké
+-- en octets pour être passé tel quel à bcrypt.checkpw().
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'utilisateurs' AND column_name = 'mdp_hash') = 'text' THEN
+        ALTER TABLE utilisateurs ALTER COLUMN mdp_hash TYPE BYTEA USING convert_to(mdp_hash, 'UTF8');
+    END IF;
+END $$;
+
 -- 5. Création de la table 'recommandations' (Notation)
 -- Table de liaison pour les notes et commentaires des utilisateurs sur les séries.
 CREATE TABLE IF NOT EXISTS recommandations (
@@ -49,4 +76,10 @@ CREATE TABLE IF NOT EXISTS recommandations (
     UNIQUE(id_utilisateur, id_series), -- Un utilisateur ne note qu'une fois une série
     FOREIGN KEY (id_utilisateur) REFERENCES utilisateurs(id) ON DELETE CASCADE,
     FOREIGN KEY (id_series) REFERENCES series(id) ON DELETE CASCADE
-);
\ No newline at end of file
+);
+
+-- Index couvrants pour les lectures de notes (parcours d'index seul, sans accès à la table):
+-- moyenne/nombre de notes d'une série (details_serie) et séries notées par un utilisateur
+-- (series_utilisateur; la contrainte UNIQUE ne couvre pas la note).
+CREATE INDEX IF NOT EXISTS idx_recommandations_serie ON recommandations (id_series) INCLUDE (note);
+CREATE INDEX IF NOT EXISTS idx_recommandations_utilisateur ON recommandations (id_utilisateur) INCLUDE (id_series, note);
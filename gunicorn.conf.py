@@ -0,0 +1,24 @@
+# Configuration gunicorn: gunicorn -c gunicorn.conf.py wsgi:app
+import os
+
+from modules.config import API_THREADS, DB_POOL_MAX, DB_BUDGET_CONNEXIONS
+
+bind = "0.0.0.0:5001"
+# Chaque worker ouvre jusqu'à DB_POOL_MAX + 1 connexions PostgreSQL (pool + LISTEN): au total
+# workers x (DB_POOL_MAX + 1). Par défaut, 2 x CPU + 1 workers, limité au budget de connexions;
+# le calcul lourd tourne déjà sur les threads gthread et le pool bcrypt.
+workers = int(os.environ.get("API_WORKERS",
+                             max(1, min(2 * (os.cpu_count() or 1) + 1, DB_BUDGET_CONNEXIONS // (DB_POOL_MAX + 1)))))
+worker_class = "gthread"
+threads = API_THREADS
+preload_app = True
+
+def post_fork(server, worker):
+    """Chaque worker ouvre son propre pool (les sockets PostgreSQL ne se partagent pas entre processus)
+    et démarre son thread de journalisation (les threads du maître ne survivent pas au fork)."""
+    from modules.journal import demarrer_journal
+    from modules.database import init_connection_pool, preparer_mapping_bdd, demarrer_ecoute_series
+    demarrer_journal()
+    init_connection_pool()
+    preparer_mapping_bdd()
+    demarrer_ecoute_series()
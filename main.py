@@ -2,7 +2,7 @@ from flask import Flask
 from flask_cors import CORS
 
 # Imports de nos modules
-from modules.database import init_connection_pool, preparer_mapping_bdd
+from modules.database import init_connection_pool, preparer_mapping_bdd, demarrer_ecoute_series
 from modules.engine import initialiser_moteur, get_moteur
 
 # Imports des blueprints
@@ -18,11 +18,16 @@ app.register_blueprint(auth_bp, url_prefix='/api')
 app.register_blueprint(search_bp, url_prefix='/api')
 app.register_blueprint(series_bp, url_prefix='/api')
 
-if __name__ == '__main__':
-    # Initialisation
+def initialiser_application():
+    """Pool PostgreSQL, moteur, mapping BDD et son écoute NOTIFY (appelé une fois par processus serveur)."""
     init_connection_pool()
     initialiser_moteur()
     preparer_mapping_bdd()
+    demarrer_ecoute_series()
+
+if __name__ == '__main__':
+    # Serveur de développement; en production: gunicorn -c gunicorn.conf.py wsgi:app
+    initialiser_application()
 
     if get_moteur() is None:
         print("L'API ne peut pas démarrer sans le moteur.")
@@ -33,4 +38,4 @@ if __name__ == '__main__':
         print(" Accès: http://localhost:5001")
         print("="*50 + "\n")
         
-        app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
+        app.run(debug=False, threaded=True, host='0.0.0.0', port=5001)
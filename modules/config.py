@@ -1,4 +1,5 @@
 # Configuration Globale
+import os
 
 DB_CONFIG = {
     "dbname": "flavien",
@@ -8,7 +9,32 @@ DB_CONFIG = {
     "port": 5432
 }
 
+# Threads de requête par worker gunicorn (lu aussi par gunicorn.conf.py)
+API_THREADS = int(os.environ.get("API_THREADS", 8))
+
+# Bornes du pool de connexions (par processus serveur). Un worker n'utilise jamais plus d'une
+# connexion par thread de requête, +1 pour la reconstruction du mapping par le thread LISTEN.
+# Total côté PostgreSQL: API_WORKERS x (DB_POOL_MAX + 1 connexion LISTEN).
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", 2))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", API_THREADS + 1))
+
+# Connexions PostgreSQL que l'API peut ouvrir au total, sous max_connections (100 par défaut)
+# en laissant de la marge pour psql, les sauvegardes et superuser_reserved_connections.
+# gunicorn.conf.py en déduit le nombre de workers par défaut: 90 // (9 + 1) = 9 workers.
+DB_BUDGET_CONNEXIONS = int(os.environ.get("DB_BUDGET_CONNEXIONS", 90))
+
+# Nombre maximal de résultats par appel ('limit'): borne aussi les clés des caches de résultats
+LIMIT_MAX_RESULTATS = 100
+# Nombre maximal de notes par appel à /noter_batch (un seul INSERT multi-lignes)
+TAILLE_MAX_LOT_NOTES = 100
+
+# Facteur de coût bcrypt (2^n itérations), fixé explicitement plutôt que le défaut de la bibliothèque.
+# Les hashes existants gardent leur propre coût: checkpw le lit dans le hash stocké.
+BCRYPT_ROUNDS = 12
+
 # Chemins des ressources du projet
 # ATTENTION: Chemin absolu spécifique à ta machine
 DOSSIER_SOUS_TITRES = "/Users/flavien/Library/CloudStorage/OneDrive-Toulouse3/Semestre5/S5.C.01/SAE/sous-titres"
-CACHE_FILE = "moteur_cache.pkl"
\ No newline at end of file
+CACHE_FILE = "moteur_cache.pkl"
+# Tableaux numpy du moteur (matrice TF-IDF CSR et CSC, voisins) et textes des séries, chargés en mmap à côté du cache
+MATRICE_CACHE_DIR = "moteur_matrice"
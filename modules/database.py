@@ -1,74 +1,188 @@
 import sys
 import time
-import re
+import atexit
+import select
+import threading
+from contextlib import contextmanager
 import psycopg2
 from psycopg2 import pool
+from psycopg2.extensions import connection as _Connexion
 from psycopg2.extras import RealDictCursor
-from functools import lru_cache
-from typing import Dict, Any
+from typing import Dict, Any, Iterable
 
-from modules.config import DB_CONFIG
+from modules.config import DB_CONFIG, DB_POOL_MIN, DB_POOL_MAX
 
 # Variables globales pour la BDD
 connection_pool = None
 bdd_mapping_cache = None
-bdd_mapping_timestamp = 0
-BDD_CACHE_TTL = 300
+bdd_mapping_version = 0  # incrémentée à chaque reconstruction: clé des caches dérivés du mapping
+bdd_mapping_lock = threading.Lock()
+ecoute_series_thread = None
+
+# Canal notifié par le trigger series_modifiees (base.sql) à chaque modification de la table series
+CANAL_SERIES = 'series_changed'
+
+# Requêtes préparées côté serveur (PREPARE) à la première utilisation sur chaque connexion
+REQUETES_PREPAREES = {
+    'details_serie': """
+        SELECT s.id, s.nom, s.resume, s.affiche_url, s.langue_originale,
+               AVG(r.note) AS note_moyenne, COUNT(r.id_series) AS nb_notes
+        FROM series s LEFT JOIN recommandations r ON r.id_series = s.id
+        WHERE s.id = $1 GROUP BY s.id
+    """,
+    'series_utilisateur': """
+        SELECT s.id, s.nom, s.resume, s.affiche_url, s.langue_originale, r.note
+        FROM recommandations r JOIN series s ON r.id_series = s.id
+        WHERE r.id_utilisateur = $1 ORDER BY r.note DESC
+    """,
+    'noter_serie': """
+        INSERT INTO recommandations (id_utilisateur, id_series, note, commentaire)
+        VALUES ($1, $2, $3, $4)
+        ON CONFLICT (id_utilisateur, id_series)
+        DO UPDATE SET note = EXCLUDED.note, date_notation = NOW()
+        RETURNING (xmax = 0) AS inserted
+    """,
+    'utilisateur_par_email': "SELECT id, mdp_hash, pseudo FROM utilisateurs WHERE email = $1",
+    'note_utilisateur': "SELECT note FROM recommandations WHERE id_utilisateur = $1 AND id_series = $2",
+    'supprimer_note': "DELETE FROM recommandations WHERE id_utilisateur = $1 AND id_series = $2",
+}
+
+class ConnexionPreparee(_Connexion):
+    """Connexion qui mémorise les requêtes déjà préparées dans sa session PostgreSQL."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requetes_preparees = set()
+
+def executer_preparee(cur, nom: str, params: tuple):
+    """Exécute la requête préparée `nom`, en la préparant d'abord si la session ne la connaît pas."""
+    conn = cur.connection
+    if nom not in conn.requetes_preparees:
+        cur.execute(f"PREPARE {nom} AS {REQUETES_PREPAREES[nom]}")
+        conn.requetes_preparees.add(nom)
+    cur.execute(f"EXECUTE {nom} ({', '.join(['%s'] * len(params))})", params)
 
 def init_connection_pool():
-    """Initialise le pool de connexions PostgreSQL."""
+    """Initialise le pool de connexions PostgreSQL (partagé entre les threads)."""
     global connection_pool
     try:
-        connection_pool = psycopg2.pool.SimpleConnectionPool(
-            1, 10,
+        connection_pool = psycopg2.pool.ThreadedConnectionPool(
+            DB_POOL_MIN, DB_POOL_MAX,
+            connection_factory=ConnexionPreparee,
             cursor_factory=RealDictCursor,
             **DB_CONFIG
         )
+        atexit.register(connection_pool.closeall)
         print(" Pool de connexions PostgreSQL initialisé.")
     except psycopg2.OperationalError as e:
         print(f"FATAL: Impossible de créer le pool de connexions. Détails: {e}", file=sys.stderr)
         sys.exit(1)
 
+@contextmanager
 def get_db_connection():
-    """Récupère une connexion disponible depuis le pool."""
-    if connection_pool:
-        return connection_pool.getconn()
-    raise ConnectionError("Pool de connexions non initialisé.")
-
-def release_db_connection(conn):
-    """Libère la connexion vers le pool."""
-    if connection_pool:
+    """Emprunte une connexion au pool et la restitue en sortie de bloc."""
+    if not connection_pool:
+        raise ConnectionError("Pool de connexions non initialisé.")
+    conn = connection_pool.getconn()
+    try:
+        yield conn
+    except Exception:
+        # Connexion potentiellement dans un état incohérent: on ne la recycle pas
+        connection_pool.putconn(conn, close=True)
+        raise
+    else:
         connection_pool.putconn(conn)
 
-@lru_cache(maxsize=1)
+# Caractères conservés dans un slug
+_CARACTERES_SLUG = frozenset("abcdefghijklmnopqrstuvwxyz0123456789àâçéèêëîïôûùüÿñæœ")
+
+class _TableSlug(dict):
+    """Table str.translate qui supprime tout caractère hors slug; chaque code est résolu une fois."""
+    def __missing__(self, code):
+        valeur = code if chr(code) in _CARACTERES_SLUG else None
+        self[code] = valeur
+        return valeur
+
+_TABLE_SLUG = _TableSlug()
+
 def aligner_nom_bdd(nom_serie: str) -> str:
     """Convertit un nom de série en slug."""
     if not nom_serie:
         return ""
-    nom = nom_serie.lower().replace(' ', '')
-    nom = re.sub(r"[^a-z0-9àâçéèêëîïôûùüÿñæœ]", "", nom) 
-    return nom
+    return nom_serie.lower().translate(_TABLE_SLUG)
 
 def preparer_mapping_bdd(force_refresh=False) -> Dict[str, Any]:
-    """Récupère le mapping {slug: données_série} depuis la BDD ou cache."""
-    global bdd_mapping_cache, bdd_mapping_timestamp
+    """Récupère le mapping {slug: données_série}: instantané figé, reconstruit sur notification."""
+    global bdd_mapping_cache, bdd_mapping_version
     
-    current_time = time.time()
-    if not force_refresh and bdd_mapping_cache and (current_time - bdd_mapping_timestamp) < BDD_CACHE_TTL:
-        return bdd_mapping_cache
+    mapping = bdd_mapping_cache
+    if mapping is not None and not force_refresh:
+        return mapping
     
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, nom, resume, affiche_url, langue_originale FROM series")
-    all_series_bdd = cur.fetchall()
-    cur.close()
-    release_db_connection(conn)
-    
-    bdd_map = {}
-    for serie in all_series_bdd:
-        slug = aligner_nom_bdd(serie['nom'])
-        bdd_map[slug] = serie
-    
-    bdd_mapping_cache = bdd_map
-    bdd_mapping_timestamp = current_time
-    return bdd_map
\ No newline at end of file
+    with bdd_mapping_lock:
+        # Un autre thread a pu construire le mapping pendant l'attente du verrou
+        if bdd_mapping_cache is not None and not force_refresh:
+            return bdd_mapping_cache
+        
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id, nom, resume, affiche_url, langue_originale FROM series")
+            all_series_bdd = cur.fetchall()
+            cur.close()
+        
+        bdd_map = {aligner_nom_bdd(serie['nom']): serie for serie in all_series_bdd}
+        
+        # Nouveau dict puis réaffectation: les lecteurs voient l'ancien ou le nouveau, jamais un état partiel
+        bdd_mapping_cache = bdd_map
+        bdd_mapping_version += 1
+        return bdd_map
+
+def recuperer_series_par_slugs(slugs: Iterable[str]) -> Dict[str, Any]:
+    """Récupère uniquement les séries demandées, sous la forme {slug: données_série}."""
+    # Mapping préchargé au démarrage (construit ici sinon): simple lookup dans l'instantané courant
+    mapping = preparer_mapping_bdd()
+    return {slug: mapping[slug] for slug in slugs if slug in mapping}
+
+def version_mapping_bdd() -> int:
+    """Numéro de l'instantané courant du mapping (change à chaque reconstruction)."""
+    return bdd_mapping_version
+
+def invalider_mapping_bdd():
+    """Reconstruit le mapping depuis la BDD (appelé sur notification de modification des séries)."""
+    preparer_mapping_bdd(force_refresh=True)
+
+def _ecouter_modifications_series():
+    """Boucle LISTEN sur une connexion dédiée (hors pool); se reconnecte si la connexion tombe."""
+    reconnexion = False
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(**DB_CONFIG)
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f"LISTEN {CANAL_SERIES}")
+            if reconnexion:
+                # Des notifications ont pu être perdues pendant la coupure
+                invalider_mapping_bdd()
+            reconnexion = True
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                if conn.notifies:
+                    # Plusieurs modifications rapprochées: une seule reconstruction
+                    conn.notifies.clear()
+                    invalider_mapping_bdd()
+        except Exception as e:
+            print(f" Écoute des modifications de séries interrompue: {e}", file=sys.stderr)
+            time.sleep(5)
+        finally:
+            if conn is not None:
+                conn.close()
+
+def demarrer_ecoute_series():
+    """Démarre (une fois par processus) le thread qui reconstruit le mapping sur NOTIFY series_changed."""
+    global ecoute_series_thread
+    if ecoute_series_thread is not None and ecoute_series_thread.is_alive():
+        return
+    ecoute_series_thread = threading.Thread(target=_ecouter_modifications_series, name="ecoute-series", daemon=True)
+    ecoute_series_thread.start()
@@ -1,12 +1,16 @@
 import sys
 import os
 import time
+import mmap
 import pickle
+from functools import lru_cache
+import numpy as np
+from scipy import sparse
 
 # On suppose que moteur_recherche.py est à la racine, donc on l'ajoute au path si besoin
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from modules.config import DOSSIER_SOUS_TITRES, CACHE_FILE
+from modules.config import DOSSIER_SOUS_TITRES, CACHE_FILE, MATRICE_CACHE_DIR
 
 try:
     from moteur_recherche import Moteur, charger_sous_titres
@@ -18,20 +22,75 @@ except ImportError:
 moteur = None
 systeme_reco = None
 
+COMPOSANTES_CSR = ('data', 'indices', 'indptr')
+# Matrices creuses de Moteur (même forme): la matrice TF-IDF en lignes (CSR) et sa copie en colonnes (CSC)
+MATRICES_MOTEUR = (('matrice', sparse.csr_matrix), ('matrice_csc', sparse.csc_matrix))
+# Tableaux denses de Moteur stockés eux aussi en .npy plutôt que dans le pickle
+TABLEAUX_MOTEUR = ('voisins_ids', 'voisins_scores', 'bornes_textes')
+# Bloc UTF-8 des textes des séries (Moteur.textes), mappé en lecture seule au chargement
+FICHIER_TEXTES = "textes.utf8"
+# À incrémenter quand la structure de Moteur change: un cache d'une autre version est reconstruit
+VERSION_CACHE = 11
+# Tampon de 1 Mo pour le pickle: moins d'appels read()/write() qu'avec le tampon par défaut (8 Ko)
+TAILLE_TAMPON_CACHE = 1 << 20
+
+def _chemin_tableau(nom):
+    return os.path.join(MATRICE_CACHE_DIR, f"{nom}.npy")
+
+def _sauvegarder_tableaux(moteur):
+    """Écrit en .npy les composantes des matrices TF-IDF et les tableaux denses du moteur, puis ses textes."""
+    os.makedirs(MATRICE_CACHE_DIR, exist_ok=True)
+    for attribut, _ in MATRICES_MOTEUR:
+        for nom in COMPOSANTES_CSR:
+            np.save(_chemin_tableau(f"{attribut}_{nom}"), getattr(getattr(moteur, attribut), nom))
+    for nom in TABLEAUX_MOTEUR:
+        np.save(_chemin_tableau(nom), getattr(moteur, nom))
+    with open(os.path.join(MATRICE_CACHE_DIR, FICHIER_TEXTES), 'wb') as f:
+        f.write(moteur.textes)
+
+def _attacher_tableaux(moteur, forme):
+    """Rattache au moteur des tableaux mappés en mémoire (lecture seule, partagés entre processus)."""
+    for attribut, format_creux in MATRICES_MOTEUR:
+        data, indices, indptr = (np.load(_chemin_tableau(f"{attribut}_{nom}"), mmap_mode='r') for nom in COMPOSANTES_CSR)
+        setattr(moteur, attribut, format_creux((data, indices, indptr), shape=forme, copy=False))
+    for nom in TABLEAUX_MOTEUR:
+        setattr(moteur, nom, np.load(_chemin_tableau(nom), mmap_mode='r'))
+    with open(os.path.join(MATRICE_CACHE_DIR, FICHIER_TEXTES), 'rb') as f:
+        moteur.textes = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _signature_corpus(dossier):
+    """(nombre de dossiers, mtime max) du dossier des sous-titres et de ses sous-dossiers; None s'il est absent.
+    Un ajout ou une suppression de fichiers change le mtime du dossier qui les contient."""
+    if not os.path.isdir(dossier):
+        return None
+    with os.scandir(dossier) as entrees:
+        mtimes = [e.stat().st_mtime_ns for e in entrees if e.is_dir()]
+    mtimes.append(os.stat(dossier).st_mtime_ns)
+    return len(mtimes), max(mtimes)
+
 def initialiser_moteur():
     """Charge le moteur depuis le cache ou le reconstruit."""
     global moteur, systeme_reco
     
+    _vider_caches_resultats()
     print(" Initialisation du moteur de recherche...")
     
     if os.path.exists(CACHE_FILE):
         start_time = time.time()
         print(" Chargement depuis le cache...")
         try:
-            with open(CACHE_FILE, 'rb') as f:
+            with open(CACHE_FILE, 'rb', buffering=TAILLE_TAMPON_CACHE) as f:
                 cache_data = pickle.load(f)
-                moteur = cache_data['moteur']
-                systeme_reco = cache_data['systeme_reco']
+            if cache_data.get('version') != VERSION_CACHE:
+                raise ValueError("version de cache obsolète")
+            # Sans dossier de sous-titres (déploiement du seul cache), on garde le cache tel quel
+            signature = _signature_corpus(DOSSIER_SOUS_TITRES)
+            if signature is not None and cache_data.get('signature_corpus') != signature:
+                raise ValueError("sous-titres modifiés depuis la création du cache")
+            moteur = cache_data['moteur']
+            _attacher_tableaux(moteur, cache_data['forme_matrice'])
+            systeme_reco = cache_data['systeme_reco']
+            print(f" Moteur chargé depuis le cache en {time.time() - start_time:.2f}s.")
             return
         except Exception as e:
             print(f" Erreur cache: {e}. Re-création forcée.", file=sys.stderr)
@@ -39,6 +98,7 @@ def initialiser_moteur():
             except OSError: pass
     
     start_time = time.time()
+    signature = _signature_corpus(DOSSIER_SOUS_TITRES)
     print("Première initialisation (chargement des sous-titres et TF-IDF)...")
     corpus = charger_sous_titres(DOSSIER_SOUS_TITRES)
     if not corpus:
@@ -49,8 +109,23 @@ def initialiser_moteur():
     systeme_reco = moteur
     
     try:
-        with open(CACHE_FILE, 'wb') as f:
-            pickle.dump({'moteur': moteur, 'systeme_reco': systeme_reco}, f)
+        # Les tableaux sont stockés à part; le pickle ne contient que le squelette du moteur
+        _sauvegarder_tableaux(moteur)
+        forme = moteur.matrice.shape
+        detaches = {nom: getattr(moteur, nom) for nom in ('matrice', 'matrice_csc', 'textes') + TABLEAUX_MOTEUR}
+        for nom in detaches:
+            setattr(moteur, nom, None)
+        try:
+            with open(CACHE_FILE, 'wb', buffering=TAILLE_TAMPON_CACHE) as f:
+                pickle.dump({'version': VERSION_CACHE, 'moteur': moteur, 'systeme_reco': systeme_reco, 'forme_matrice': forme,
+                             'signature_corpus': signature},
+                            f, protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            for nom, valeur in detaches.items():
+                setattr(moteur, nom, valeur)
+        # Même après une construction complète, on sert les tableaux depuis les fichiers mappés:
+        # les workers forkés partagent alors les pages du cache disque au lieu d'une copie en tas
+        _attacher_tableaux(moteur, forme)
         print(f" Moteur initialisé et mis en cache en {time.time() - start_time:.2f}s!")
     except Exception as e:
         print(f" Attention: Impossible de sauvegarder le cache: {e}", file=sys.stderr)
@@ -59,4 +134,30 @@ def get_moteur():
     return moteur
 
 def get_systeme_reco():
-    return systeme_reco
\ No newline at end of file
+    return systeme_reco
+
+# Le corpus est figé après initialisation: les résultats peuvent être mémoïsés.
+# Les valeurs en cache sont partagées, les appelants ne doivent pas les modifier.
+@lru_cache(maxsize=1024)
+def _rechercher_normalise(requete: str, top_k: int):
+    return moteur.rechercher(requete, top_k=top_k)
+
+@lru_cache(maxsize=1024)
+def _recommander_par_similarite(serie_nom: str, top_k: int):
+    return systeme_reco.recommander_par_similarite(serie_nom, top_k=top_k)
+
+def normaliser_requete(requete: str) -> str:
+    """Casse et espaces normalisés: clé de cache commune aux variantes d'une même requête."""
+    return " ".join(requete.lower().split())
+
+def rechercher_avec_cache(requete: str, top_k: int):
+    """moteur.rechercher() mémoïsé; la requête est normalisée (casse, espaces) pour mieux partager le cache."""
+    return _rechercher_normalise(normaliser_requete(requete), top_k)
+
+def recommander_par_similarite_avec_cache(serie_nom: str, top_k: int):
+    """systeme_reco.recommander_par_similarite() mémoïsé."""
+    return _recommander_par_similarite(serie_nom, top_k)
+
+def _vider_caches_resultats():
+    _rechercher_normalise.cache_clear()
+    _recommander_par_similarite.cache_clear()
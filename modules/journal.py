@@ -0,0 +1,42 @@
+import atexit
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+# Les threads de requête ne font que déposer l'enregistrement dans une file;
+# l'écriture sur stderr est faite par le thread du QueueListener.
+_file_logs = queue.SimpleQueue()
+_ecouteur = None
+_pid_ecouteur = None
+
+_racine = logging.getLogger('api')
+_racine.setLevel(logging.INFO)
+_racine.addHandler(QueueHandler(_file_logs))
+_racine.propagate = False
+
+def demarrer_journal():
+    """Démarre le thread qui vide la file des logs, une fois par processus.
+
+    Un fork n'hérite pas des threads: sous gunicorn (preload_app), chaque worker
+    l'appelle dans post_fork, sinon ses logs resteraient dans la file.
+    """
+    global _ecouteur, _pid_ecouteur
+    if _pid_ecouteur == os.getpid():
+        return
+    _ecouteur = QueueListener(_file_logs, logging.StreamHandler(), respect_handler_level=True)
+    _ecouteur.start()
+    _pid_ecouteur = os.getpid()
+
+def _arreter_journal():
+    # atexit est hérité au fork: n'arrêter que l'écouteur démarré par ce processus
+    if _ecouteur is not None and _pid_ecouteur == os.getpid():
+        _ecouteur.stop()
+
+atexit.register(_arreter_journal)
+# Processus qui importe l'application (maître gunicorn, serveur de développement)
+demarrer_journal()
+
+def get_logger(nom: str) -> logging.Logger:
+    """Logger de l'API (sous-logger de 'api'), écrit de façon asynchrone."""
+    return _racine.getChild(nom)
@@ -0,0 +1,74 @@
+import hashlib
+from decimal import Decimal
+from flask import Response, current_app, request
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _par_defaut(obj):
+    """Types renvoyés par psycopg2 que orjson ne sait pas encoder nativement."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError
+
+def _encoder(obj) -> bytes:
+    """Sérialise en JSON avec orjson (repli sur l'encodeur de Flask si absent)."""
+    if orjson is None:
+        return current_app.json.dumps(obj).encode('utf-8')
+    return orjson.dumps(obj, default=_par_defaut, option=orjson.OPT_SERIALIZE_NUMPY)
+
+def lire_corps_json():
+    """Corps de la requête décodé par orjson (repli sur request.get_json); None si ce n'est pas un objet JSON."""
+    if orjson is None:
+        data = request.get_json(silent=True)
+    else:
+        try:
+            data = orjson.loads(request.get_data())
+        except orjson.JSONDecodeError:
+            data = None
+    return data if isinstance(data, dict) else None
+
+def ojsonify(obj) -> Response:
+    """Équivalent de jsonify() encodé par orjson."""
+    return Response(_encoder(obj), mimetype='application/json')
+
+def encoder_json(obj) -> bytes:
+    """JSON encodé une fois pour être réutilisé comme fragment (voir ojsonify_avec_fragment)."""
+    return _encoder(obj)
+
+def etag_json(corps: bytes) -> str:
+    return hashlib.blake2b(corps, digest_size=16).hexdigest()
+
+def _conditionnelle(reponse: Response, etag: str, max_age: int, weak: bool = False) -> Response:
+    """weak=True quand l'ETag ne couvre pas tout le corps: deux corps différents
+    ne peuvent pas partager un validateur fort (RFC 9110), seulement un faible."""
+    reponse.set_etag(etag, weak=weak)
+    reponse.cache_control.public = True
+    reponse.cache_control.max_age = max_age
+    return reponse.make_conditional(request)
+
+def ojsonify_cachable(obj, max_age: int = 60, contenu_etag=None) -> Response:
+    """ojsonify() avec Cache-Control et ETag; répond 304 si le client a déjà cette version.
+
+    contenu_etag permet de calculer l'ETag sur la partie stable de la réponse
+    (sans les temps de calcul, par exemple) plutôt que sur le corps entier;
+    l'ETag est alors faible.
+    """
+    reponse = ojsonify(obj)
+    if contenu_etag is None:
+        return _conditionnelle(reponse, etag_json(reponse.get_data()), max_age)
+    return _conditionnelle(reponse, etag_json(_encoder(contenu_etag)), max_age, weak=True)
+
+def ojsonify_avec_fragment(obj: dict, cle: str, fragment: bytes, etag: str, max_age: int = 60,
+                           weak: bool = False) -> Response:
+    """Comme ojsonify_cachable(), avec obj[cle] fourni déjà encodé (fragment JSON) et l'ETag précalculé.
+
+    weak=True si obj contient des champs qui ne sont pas déterminés par le fragment
+    (requête brute, temps de calcul...): l'ETag du fragment ne vaut alors que comme validateur faible.
+    """
+    corps = _encoder(obj)
+    separateur = b',' if len(obj) else b''
+    corps = corps[:-1] + separateur + _encoder(cle) + b':' + fragment + b'}'
+    return _conditionnelle(Response(corps, mimetype='application/json'), etag, max_age, weak=weak)
@@ -1,71 +1,89 @@
-import sys
+import os
 import bcrypt
 import psycopg2
-from flask import Blueprint, request, jsonify
-from modules.database import get_db_connection, release_db_connection
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint
+from modules.config import BCRYPT_ROUNDS
+from modules.database import get_db_connection, executer_preparee
+from modules.reponses import lire_corps_json, ojsonify
+from modules.journal import get_logger
 
 auth_bp = Blueprint('auth', __name__)
+logger = get_logger(__name__)
+
+# bcrypt relâche le GIL: un pool borné au nombre de cœurs évite que des rafales
+# d'inscriptions/connexions saturent tous les threads du serveur
+_BCRYPT_POOL = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='bcrypt')
+
+def hacher_mot_de_passe(password: str) -> bytes:
+    """Hache le mot de passe (coût BCRYPT_ROUNDS) dans le pool bcrypt."""
+    return _BCRYPT_POOL.submit(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).result()
+
+def verifier_mot_de_passe(password: str, mdp_hash: bytes) -> bool:
+    """Vérifie le mot de passe contre le hash stocké (colonne BYTEA), dans le pool bcrypt."""
+    return _BCRYPT_POOL.submit(bcrypt.checkpw, password.encode('utf-8'), mdp_hash).result()
 
 @auth_bp.route('/utilisateur/inscription', methods=['POST'])
 def inscription():
     try:
-        data = request.get_json()
+        data = lire_corps_json()
+        if data is None:
+            return ojsonify({"error": "Corps JSON (objet) requis"}), 400
         email = data.get('email')
         password = data.get('password')
-        pseudo = data.get('pseudo', email.split('@')[0])
         
         if not email or not password:
-            return jsonify({"error": "Email et mot de passe requis"}), 400
+            return ojsonify({"error": "Email et mot de passe requis"}), 400
+        pseudo = data.get('pseudo', email.split('@')[0])
 
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        hashed_password = hacher_mot_de_passe(password)
         
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        try:
-            cur.execute("""
-                INSERT INTO utilisateurs (pseudo, email, mdp_hash)
-                VALUES (%s, %s, %s)
-                RETURNING id
-            """, (pseudo, email, hashed_password.decode('utf-8')))
-            
-            user_id = cur.fetchone()['id']
-            conn.commit()
-            return jsonify({"message": "Inscription réussie", "user_id": user_id, "pseudo": pseudo}), 201
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute("""
+                    INSERT INTO utilisateurs (pseudo, email, mdp_hash)
+                    VALUES (%s, %s, %s)
+                    RETURNING id
+                """, (pseudo, email, psycopg2.Binary(hashed_password)))
+                
+                user_id = cur.fetchone()['id']
+                conn.commit()
+                return ojsonify({"message": "Inscription réussie", "user_id": user_id, "pseudo": pseudo}), 201
+                
+            except psycopg2.IntegrityError:
+                conn.rollback()
+                return ojsonify({"error": "Cet email est déjà utilisé."}), 409
+            finally:
+                cur.close()
             
-        except psycopg2.IntegrityError:
-            conn.rollback()
-            return jsonify({"error": "Cet email est déjà utilisé."}), 409
-        finally:
-            cur.close()
-            release_db_connection(conn)
-            
-    except Exception as e:
-        print(f"Erreur inscription: {e}", file=sys.stderr)
-        return jsonify({"error": "Erreur interne lors de l'inscription."}), 500
+    except Exception:
+        logger.exception("Erreur inscription")
+        return ojsonify({"error": "Erreur interne lors de l'inscription."}), 500
 
 @auth_bp.route('/utilisateur/connexion', methods=['POST'])
 def connexion():
     try:
-        data = request.get_json()
+        data = lire_corps_json()
+        if data is None:
+            return ojsonify({"error": "Corps JSON (objet) requis"}), 400
         email = data.get('email')
         password = data.get('password')
         
         if not email or not password:
-            return jsonify({"error": "Email et mot de passe requis"}), 400
+            return ojsonify({"error": "Email et mot de passe requis"}), 400
         
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT id, mdp_hash, pseudo FROM utilisateurs WHERE email = %s", (email,))
-        user = cur.fetchone()
-        cur.close()
-        release_db_connection(conn)
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            executer_preparee(cur, 'utilisateur_par_email', (email,))
+            user = cur.fetchone()
+            cur.close()
         
-        if user and isinstance(user['mdp_hash'], str) and bcrypt.checkpw(password.encode('utf-8'), user['mdp_hash'].encode('utf-8')):
-            return jsonify({"message": "Connexion réussie", "user_id": user['id'], "pseudo": user['pseudo']}), 200
+        if user and verifier_mot_de_passe(password, bytes(user['mdp_hash'])):
+            return ojsonify({"message": "Connexion réussie", "user_id": user['id'], "pseudo": user['pseudo']}), 200
         else:
-            return jsonify({"error": "Email ou mot de passe incorrect."}), 401
+            return ojsonify({"error": "Email ou mot de passe incorrect."}), 401
             
-    except Exception as e:
-        print(f"Erreur connexion fatale: {e}", file=sys.stderr)
-        return jsonify({"error": "Erreur interne lors de la connexion."}), 500
\ No newline at end of file
+    except Exception:
+        logger.exception("Erreur connexion fatale")
+        return ojsonify({"error": "Erreur interne lors de la connexion."}), 500
\ No newline at end of file
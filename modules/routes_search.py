@@ -1,108 +1,130 @@
-import sys
 import time
-from flask import Blueprint, request, jsonify
-from modules.database import preparer_mapping_bdd
-from modules.engine import get_moteur, get_systeme_reco
+from functools import lru_cache
+from flask import Blueprint, request
+from modules.config import LIMIT_MAX_RESULTATS
+from modules.database import recuperer_series_par_slugs, version_mapping_bdd
+from modules.engine import get_moteur, get_systeme_reco, normaliser_requete, rechercher_avec_cache, recommander_par_similarite_avec_cache
+from modules.reponses import lire_corps_json, ojsonify, ojsonify_avec_fragment, encoder_json, etag_json
+from modules.journal import get_logger
 
 search_bp = Blueprint('search', __name__)
+logger = get_logger(__name__)
+ERREUR_LIMIT = f"Paramètre 'limit' entier entre 1 et {LIMIT_MAX_RESULTATS} requis"
+
+def _limit_valide(limit) -> bool:
+    return isinstance(limit, int) and not isinstance(limit, bool) and 1 <= limit <= LIMIT_MAX_RESULTATS
+
+def _lire_limit(defaut: int):
+    """Paramètre 'limit' de la query string; None s'il n'est pas un entier dans les bornes.
+    (type=int de Werkzeug retomberait silencieusement sur la valeur par défaut.)"""
+    try:
+        limit = int(request.args.get('limit', defaut))
+    except ValueError:
+        return None
+    return limit if _limit_valide(limit) else None
+
+@lru_cache(maxsize=1024)
+def _resultats_recherche_serialises(requete_normalisee: str, limit: int, version_mapping: int):
+    """Résultats enrichis d'une requête, déjà encodés en JSON: (corps, nombre, etag).
+
+    version_mapping fait partie de la clé: après une reconstruction du mapping BDD,
+    les anciennes entrées ne sont plus jamais relues et sortent du LRU.
+    """
+    resultats = rechercher_avec_cache(requete_normalisee, limit)
+    bdd_map = recuperer_series_par_slugs(hit.slug for hit in resultats)
+    # Les lignes BDD ont déjà les champs publics (id, nom, resume, affiche_url, langue_originale)
+    series_enrichies = [
+        {**bdd_map[hit.slug], "score": hit.score, "details_score": {"tfidf": hit.tfidf, "couverture": hit.couverture}}
+        for hit in resultats if hit.slug in bdd_map
+    ]
+    corps = encoder_json(series_enrichies)
+    return corps, len(series_enrichies), etag_json(corps)
 
 @search_bp.route('/recherche', methods=['GET'])
 def rechercher_series():
     moteur = get_moteur()
     if moteur is None:
-        return jsonify({"error": "Le moteur de recherche n'a pas pu être initialisé."}), 503
+        return ojsonify({"error": "Le moteur de recherche n'a pas pu être initialisé."}), 503
 
     try:
         requete = request.args.get('q', '').strip()
-        limit = int(request.args.get('limit', 20))
+        limit = _lire_limit(20)
         
         if not requete:
-            return jsonify({"error": "Paramètre 'q' requis"}), 400
+            return ojsonify({"error": "Paramètre 'q' requis"}), 400
+        if limit is None:
+            return ojsonify({"error": ERREUR_LIMIT}), 400
         
         start_search_time = time.time()
-        resultats = moteur.rechercher(requete, top_k=limit)
+        corps_resultats, nombre, etag = _resultats_recherche_serialises(normaliser_requete(requete), limit, version_mapping_bdd())
         search_time = time.time() - start_search_time
 
-        bdd_map = preparer_mapping_bdd()
-        series_enrichies = []
-        
-        for serie_slug, score, details in resultats:
-            if serie_slug in bdd_map:
-                serie_info = bdd_map[serie_slug]
-                series_enrichies.append({
-                    "id": serie_info['id'],
-                    "nom": serie_info['nom'],
-                    "resume": serie_info['resume'],
-                    "affiche_url": serie_info['affiche_url'],
-                    "langue_originale": serie_info['langue_originale'],
-                    "score": round(score, 4),
-                    "details_score": {
-                        "tfidf": round(details.get('tfidf', 0), 4),
-                        "couverture": round(details.get('couverture', 0), 4)
-                    }
-                })
-        
-        return jsonify({
+        return ojsonify_avec_fragment({
             "requete": requete,
             "temps_recherche_ms": round(search_time * 1000, 2),
-            "nombre_resultats": len(series_enrichies),
-            "resultats": series_enrichies
-        })
-    except Exception as e:
-        print(f"Erreur recherche: {e}", file=sys.stderr)
-        return jsonify({"error": "Erreur interne du serveur."}), 500
+            "nombre_resultats": nombre,
+        }, "resultats", corps_resultats, etag, weak=True)
+    except Exception:
+        logger.exception("Erreur recherche")
+        return ojsonify({"error": "Erreur interne du serveur."}), 500
+
+@lru_cache(maxsize=1024)
+def _similaires_serialises(serie_slug: str, limit: int, version_mapping: int):
+    """Séries similaires enrichies, déjà encodées en JSON: (corps, nombre, etag); même clé de version que la recherche."""
+    recommandations = recommander_par_similarite_avec_cache(serie_slug, limit)
+    bdd_map = recuperer_series_par_slugs(slug for slug, _ in recommandations)
+    series_recommandees = [
+        {**bdd_map[nom_slug], "score_similarite": score}
+        for nom_slug, score in recommandations if nom_slug in bdd_map
+    ]
+    corps = encoder_json(series_recommandees)
+    return corps, len(series_recommandees), etag_json(corps)
 
 @search_bp.route('/recommandations/similarite', methods=['GET'])
 def recommandations_similarite():
     systeme_reco = get_systeme_reco()
     if systeme_reco is None:
-        return jsonify({"error": "Le moteur de recommandation non initialisé."}), 503
+        return ojsonify({"error": "Le moteur de recommandation non initialisé."}), 503
 
     try:
         serie_nom_slug = request.args.get('serie', '').strip()
-        limit = int(request.args.get('limit', 5))
+        limit = _lire_limit(5)
         
-        if not serie_nom_slug: return jsonify({"error": "Paramètre 'serie' requis"}), 400
-        if serie_nom_slug not in systeme_reco.series: return jsonify({"error": "Série introuvable"}), 404
+        if not serie_nom_slug: return ojsonify({"error": "Paramètre 'serie' requis"}), 400
+        if limit is None: return ojsonify({"error": ERREUR_LIMIT}), 400
+        if serie_nom_slug not in systeme_reco.series_idx: return ojsonify({"error": "Série introuvable"}), 404
         
         start_reco_time = time.time()
-        recommandations = systeme_reco.recommander_par_similarite(serie_nom_slug, top_k=limit)
+        corps_resultats, _, etag = _similaires_serialises(serie_nom_slug, limit, version_mapping_bdd())
         reco_time = time.time() - start_reco_time
-        
-        bdd_map = preparer_mapping_bdd()
-        series_recommandees = []
-        for nom_slug, score in recommandations:
-            if nom_slug in bdd_map:
-                serie_info = bdd_map[nom_slug]
-                series_recommandees.append({
-                    "id": serie_info['id'],
-                    "nom": serie_info['nom'],
-                    "affiche_url": serie_info['affiche_url'],
-                    "resume": serie_info['resume'],
-                    "langue_originale": serie_info['langue_originale'],
-                    "score_similarite": round(score, 4)
-                })
 
-        return jsonify({
+        return ojsonify_avec_fragment({
             "serie_reference": serie_nom_slug,
             "temps_reco_ms": round(reco_time * 1000, 2),
-            "resultats": series_recommandees
-        })
+        }, "resultats", corps_resultats, etag, weak=True)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return ojsonify({"error": str(e)}), 500
 
 @search_bp.route('/recommandations/profil', methods=['POST'])
 def recommandations_profil():
     systeme_reco = get_systeme_reco()
-    if systeme_reco is None: return jsonify({"error": "Moteur non initialisé."}), 503
+    if systeme_reco is None: return ojsonify({"error": "Moteur non initialisé."}), 503
         
     try:
-        data = request.get_json()
+        data = lire_corps_json()
+        if data is None:
+            return ojsonify({"error": "Corps JSON (objet) requis"}), 400
         series_aimees = data.get('series_aimees', [])
         limit = data.get('limit', 5)
+        if not isinstance(series_aimees, list) or not all(isinstance(nom, str) for nom in series_aimees):
+            return ojsonify({"error": "'series_aimees' doit être une liste de slugs"}), 400
+        if not _limit_valide(limit):
+            return ojsonify({"error": ERREUR_LIMIT}), 400
         
         recommandations = systeme_reco.recommander_par_profil(series_aimees, top_k=limit)
-        bdd_map = preparer_mapping_bdd()
+        if not recommandations:
+            return ojsonify({"recommandations": []})
+        bdd_map = recuperer_series_par_slugs(slug for slug, _ in recommandations)
         series_recommandees = []
         for nom_slug, score in recommandations:
             if nom_slug in bdd_map:
@@ -112,9 +134,9 @@ def recommandations_profil():
                     "nom": serie_info['nom'],
                     "affiche_url": serie_info['affiche_url'],
                     "resume": serie_info['resume'],
-                    "score_profil": round(score, 4)
+                    "score_profil": score
                 })
         
-        return jsonify({"recommandations": series_recommandees})
+        return ojsonify({"recommandations": series_recommandees})
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return ojsonify({"error": str(e)}), 500
\ No newline at end of file
@@ -1,110 +1,172 @@
 import sys
 import psycopg2
-from flask import Blueprint, request, jsonify
-from modules.database import get_db_connection, release_db_connection, preparer_mapping_bdd
+from psycopg2.extensions import cursor as CurseurTuple
+from psycopg2.extras import execute_values
+from flask import Blueprint, request
+from modules.config import TAILLE_MAX_LOT_NOTES
+from modules.database import get_db_connection, executer_preparee, preparer_mapping_bdd
 from modules.engine import get_moteur
+from modules.reponses import lire_corps_json, ojsonify, ojsonify_cachable, ojsonify_avec_fragment, encoder_json, etag_json
 
 series_bp = Blueprint('series', __name__)
 
+# Séries du corpus présentes en BDD, dans l'ordre du moteur, déjà encodées en JSON
+# pour un instantané donné du mapping: (mapping, corps, nombre, etag)
+_series_corpus_cache = (None, b'[]', 0, None)
+
+def _series_du_corpus(moteur):
+    global _series_corpus_cache
+    bdd_map = preparer_mapping_bdd()
+    if _series_corpus_cache[0] is not bdd_map:
+        # Mapping reconstruit (NOTIFY series_changed) depuis le dernier appel
+        series = [{**bdd_map[slug], "note_moyenne": None} for slug in moteur.series if slug in bdd_map]
+        corps = encoder_json(series)
+        _series_corpus_cache = (bdd_map, corps, len(series), etag_json(corps))
+    return _series_corpus_cache[1:]
+
 @series_bp.route('/series', methods=['GET'])
 def lister_series():
     moteur = get_moteur()
-    if moteur is None: return jsonify({"error": "Moteur non initialisé."}), 503
+    if moteur is None: return ojsonify({"error": "Moteur non initialisé."}), 503
     try:
-        bdd_map = preparer_mapping_bdd()
-        series_enrichies = []
-        for serie_slug in moteur.series:
-            if serie_slug in bdd_map:
-                series_enrichies.append({**bdd_map[serie_slug], "note_moyenne": None})
-        return jsonify({"nombre_series": len(series_enrichies), "series": series_enrichies})
+        corps_series, nombre, etag = _series_du_corpus(moteur)
+        return ojsonify_avec_fragment({"nombre_series": nombre}, "series", corps_series, etag)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return ojsonify({"error": str(e)}), 500
 
 @series_bp.route('/series/<int:serie_id>', methods=['GET'])
 def details_serie(serie_id):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM series WHERE id = %s", (serie_id,))
-        serie = cur.fetchone()
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            executer_preparee(cur, 'details_serie', (serie_id,))
+            serie = cur.fetchone()
+            cur.close()
         
         if not serie:
-            cur.close(); release_db_connection(conn)
-            return jsonify({"error": "Série introuvable"}), 404
-        
-        cur.execute("SELECT AVG(note) as note_moyenne, COUNT(*) as nb_notes FROM recommandations WHERE id_series = %s", (serie_id,))
-        notes_info = cur.fetchone()
-        cur.close(); release_db_connection(conn)
+            return ojsonify({"error": "Série introuvable"}), 404
         
-        return jsonify({
+        note_moyenne = serie['note_moyenne']
+        # max_age=0: la note moyenne bouge à chaque notation, le client revalide (304 si inchangée)
+        return ojsonify_cachable({
             **serie,
-            "note_moyenne": round(float(notes_info['note_moyenne']), 1) if notes_info['note_moyenne'] else None,
-            "nb_notes": notes_info['nb_notes']
-        })
+            "note_moyenne": round(float(note_moyenne), 1) if note_moyenne else None
+        }, max_age=0)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return ojsonify({"error": str(e)}), 500
+
+def _entier(valeur) -> bool:
+    return isinstance(valeur, int) and not isinstance(valeur, bool)
+
+def _notation_valide(serie_id, note) -> bool:
+    """Validation en mémoire, avant tout accès BDD (mêmes bornes que la contrainte CHECK)."""
+    return _entier(serie_id) and _entier(note) and 1 <= note <= 5
 
 @series_bp.route('/utilisateur/<int:user_id>/noter', methods=['POST'])
 def noter_serie(user_id):
     try:
-        data = request.get_json()
+        data = lire_corps_json()
+        if data is None:
+            return ojsonify({"error": "Corps JSON (objet) requis"}), 400
         serie_id, note = data.get('serie_id'), data.get('note')
+        if not _notation_valide(serie_id, note):
+            return ojsonify({"error": "'serie_id' entier et 'note' entière entre 1 et 5 requis"}), 400
         
-        conn = get_db_connection()
-        cur = conn.cursor()
-        try:
-            cur.execute("""
-                INSERT INTO recommandations (id_utilisateur, id_series, note, commentaire)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (id_utilisateur, id_series) 
-                DO UPDATE SET note = EXCLUDED.note, date_notation = NOW()
-            """, (user_id, serie_id, note, data.get('commentaire', '')))
-            conn.commit()
-            return jsonify({"message": "Note enregistrée"}), 200
-        except psycopg2.IntegrityError:
-            conn.rollback()
-            return jsonify({"error": "Erreur BDD"}), 409
-        finally:
-            cur.close(); release_db_connection(conn)
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            try:
+                executer_preparee(cur, 'noter_serie', (user_id, serie_id, note, data.get('commentaire', '')))
+                inserted = cur.fetchone()['inserted']
+                conn.commit()
+                return ojsonify({"message": "Note enregistrée" if inserted else "Note mise à jour"}), 200
+            except psycopg2.IntegrityError:
+                conn.rollback()
+                return ojsonify({"error": "Erreur BDD"}), 409
+            finally:
+                cur.close()
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return ojsonify({"error": str(e)}), 500
+
+@series_bp.route('/utilisateur/<int:user_id>/noter_batch', methods=['POST'])
+def noter_series_batch(user_id):
+    """Enregistre plusieurs notes en un seul INSERT multi-lignes."""
+    try:
+        data = lire_corps_json()
+        if data is None:
+            return ojsonify({"error": "Corps JSON (objet) requis"}), 400
+        notes = data.get('notes') or []
+        if not isinstance(notes, list) or not notes:
+            return ojsonify({"error": "Liste 'notes' requise"}), 400
+        if len(notes) > TAILLE_MAX_LOT_NOTES:
+            return ojsonify({"error": f"Au plus {TAILLE_MAX_LOT_NOTES} notes par lot"}), 400
+        if not all(isinstance(n, dict) and _notation_valide(n.get('serie_id'), n.get('note')) for n in notes):
+            return ojsonify({"error": "Chaque note requiert 'serie_id' entier et 'note' entière entre 1 et 5"}), 400
+        if not all(isinstance(n.get('commentaire', ''), str) for n in notes):
+            return ojsonify({"error": "'commentaire' doit être une chaîne"}), 400
+        
+        # Une série notée deux fois dans le lot: la dernière note l'emporte
+        # (ON CONFLICT ne peut pas mettre à jour deux fois la même ligne)
+        lignes = {n.get('serie_id'): (user_id, n.get('serie_id'), n.get('note'), n.get('commentaire', ''))
+                  for n in notes}
+        
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            try:
+                resultats = execute_values(cur, """
+                    INSERT INTO recommandations (id_utilisateur, id_series, note, commentaire)
+                    VALUES %s
+                    ON CONFLICT (id_utilisateur, id_series) 
+                    DO UPDATE SET note = EXCLUDED.note, date_notation = NOW()
+                    RETURNING (xmax = 0) AS inserted
+                """, list(lignes.values()), template="(%s, %s, %s, %s)", page_size=500, fetch=True)
+                conn.commit()
+                nb_creees = sum(1 for ligne in resultats if ligne['inserted'])
+                return ojsonify({
+                    "message": "Notes enregistrées",
+                    "nombre_notes": len(lignes),
+                    "nombre_creees": nb_creees,
+                    "nombre_mises_a_jour": len(lignes) - nb_creees
+                }), 200
+            except psycopg2.IntegrityError:
+                conn.rollback()
+                return ojsonify({"error": "Erreur BDD"}), 409
+            finally:
+                cur.close()
+    except Exception as e:
+        return ojsonify({"error": str(e)}), 500
 
 @series_bp.route('/utilisateur/<int:user_id>/series', methods=['GET'])
 def series_utilisateur(user_id):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT s.*, r.note 
-            FROM recommandations r JOIN series s ON r.id_series = s.id 
-            WHERE r.id_utilisateur = %s ORDER BY r.note DESC
-        """, (user_id,))
-        series = cur.fetchall()
-        cur.close(); release_db_connection(conn)
-        return jsonify({"series": series, "nombre_series": len(series)})
+        with get_db_connection() as conn:
+            cur = conn.cursor()
+            executer_preparee(cur, 'series_utilisateur', (user_id,))
+            series = cur.fetchall()
+            cur.close()
+        return ojsonify({"series": series, "nombre_series": len(series)})
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return ojsonify({"error": str(e)}), 500
 
 @series_bp.route('/utilisateur/<int:user_id>/series/<int:serie_id>/note', methods=['DELETE', 'GET'])
 def gestion_note(user_id, serie_id):
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        if request.method == 'DELETE':
-            cur.execute("DELETE FROM recommandations WHERE id_utilisateur = %s AND id_series = %s", (user_id, serie_id))
-            deleted = cur.rowcount
-            conn.commit()
-            cur.close()
-            release_db_connection(conn)
-            
-            if deleted:
-                return jsonify({"message": "Supprimé"}), 200 
-            else:
-                return jsonify({"error": "Pas trouvé"}), 404 
-        else: 
-            cur.execute("SELECT note FROM recommandations WHERE id_utilisateur = %s AND id_series = %s", (user_id, serie_id))
-            note = cur.fetchone()
-            cur.close(); release_db_connection(conn)
-            return jsonify({"note": note['note'] if note else 0}), 200
+        with get_db_connection() as conn:
+            # Curseur tuple: une seule colonne (ou seulement rowcount), pas besoin d'un dict par ligne
+            cur = conn.cursor(cursor_factory=CurseurTuple)
+            if request.method == 'DELETE':
+                executer_preparee(cur, 'supprimer_note', (user_id, serie_id))
+                deleted = cur.rowcount
+                conn.commit()
+                cur.close()
+                
+                if deleted:
+                    return ojsonify({"message": "Supprimé"}), 200 
+                else:
+                    return ojsonify({"error": "Pas trouvé"}), 404 
+            else: 
+                executer_preparee(cur, 'note_utilisateur', (user_id, serie_id))
+                note = cur.fetchone()
+                cur.close()
+                return ojsonify({"note": note[0] if note else 0}), 200
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return ojsonify({"error": str(e)}), 500
\ No newline at end of file
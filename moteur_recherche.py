@@ -1,13 +1,31 @@
+import io
 import os
-import re
+import threading
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from collections import OrderedDict, namedtuple
 import numpy as np
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 from typing import Dict, List, Tuple
 from nltk.corpus import stopwords
 import math
 
+# Nombre de voisins précalculés par série (couvre tout `limit` raisonnable de l'API)
+NB_VOISINS = 50
+
+# Taille maximale (décompressée) d'un fichier de sous-titres lu dans une archive
+TAILLE_MAX_ENTREE_ZIP = 20 * 1024 * 1024
+
+# Nombre maximal de mots de requête dont la présence par série est mémorisée (LRU)
+TAILLE_CACHE_PRESENCE = 4096
+# Protège le LRU de présence partagé par les threads de requête (au niveau du module:
+# un verrou ne se picke pas, et le moteur est mis en cache par pickle)
+_VERROU_PRESENCE = threading.Lock()
+
+# Résultat de recherche: slug de la série, score global et détails arrondis à 4 décimales
+Hit = namedtuple('Hit', ('slug', 'score', 'tfidf', 'couverture'))
+
 # Dictionnaire de traduction simple pour l'enrichissement sémantique des requêtes
 TRADUCTION_ENRICHISSEMENT = {
     'ile': 'island',
@@ -20,6 +38,14 @@ TRADUCTION_ENRICHISSEMENT = {
     'docteur': 'doctor',
     'médecin': 'doctor'
 }
+_MOTS_TRADUISIBLES = frozenset(TRADUCTION_ENRICHISSEMENT)
+
+# Règles du boost iconique: (mots-clés de la requête, fragment du slug de la série)
+REGLES_ICONIQUES = (
+    (frozenset(('ile', 'avion', 'crash', 'island', 'plane', 'wreck')), 'lost'),  # Lost / Crash avion île
+    (frozenset(('meth', 'drogue')), 'breakingbad'),                               # Breaking Bad / Meth
+    (frozenset(('hopital', 'docteur', 'doctor')), 'house'),                       # House / Doctor / Hopital
+)
 
 try:
     STOP_WORDS_FR_OR_EN = stopwords.words('english') 
@@ -30,12 +56,22 @@ except LookupError:
 # --- 1. Fonctions de Préparation des Données ---
 # ==============================================================================
 
+# Caractères conservés par nettoyer(); tout autre caractère (espaces compris) devient une espace
+_CARACTERES_TEXTE = frozenset("abcdefghijklmnopqrstuvwxyz0123456789àâçéèêëîïôûùüÿñæœ")
+
+class _TableNettoyage(dict):
+    """ str.translate table mapping every non-kept character to a space; each code is resolved once. """
+    def __missing__(self, code):
+        valeur = code if chr(code) in _CARACTERES_TEXTE else 0x20
+        self[code] = valeur
+        return valeur
+
+_TABLE_NETTOYAGE = _TableNettoyage()
+
 def nettoyer(texte: str) -> str:
     """ Cleans the text (lowercase, removal of special characters). """
-    texte = texte.lower()
-    texte = re.sub(r"[^a-z0-9àâçéèêëîïôûùüÿñæœ\s]", " ", texte)
-    texte = re.sub(r"\s+", " ", texte)
-    return texte.strip()
+    # Un seul passage str.translate puis split/join (espaces multiples et bords) au lieu de deux re.sub
+    return " ".join(texte.lower().translate(_TABLE_NETTOYAGE).split())
 
 def lire_fichier(path: str) -> str:
     """ Tries to read the file, ignoring encoding errors. """
@@ -46,58 +82,78 @@ def lire_fichier(path: str) -> str:
         return ""
 
 def lire_zip(path: str) -> str:
-    """ Reads the content of .srt or .txt files inside a zip archive. """
+    """ Reads the content of .srt or .txt files inside a zip archive (nested archives are skipped). """
     contenu = []
     try:
         with zipfile.ZipFile(path, "r") as z:
-            for name in z.namelist():
-                if name.lower().endswith((".srt", ".txt", ".zip")):
-                    try:
-                        data = z.read(name)
-                        contenu.append(data.decode("utf-8", errors='ignore'))
-                    except Exception:
-                        pass
+            for info in z.infolist():
+                if not info.filename.lower().endswith((".srt", ".txt")) or info.file_size > TAILLE_MAX_ENTREE_ZIP:
+                    continue
+                try:
+                    # Décodage au fil de la lecture: pas de copie intégrale en bytes avant le str
+                    with z.open(info) as fichier:
+                        contenu.append(io.TextIOWrapper(fichier, encoding="utf-8", errors='ignore').read())
+                except Exception:
+                    pass
     except Exception:
         pass
     return " ".join(contenu)
 
+def charger_serie(dossier: str, serie_nom: str) -> Tuple[str, str]:
+    """ Reads and cleans the subtitles of one series folder; returns (serie_nom, texte_nettoye). """
+    path = os.path.join(dossier, serie_nom)
+    morceaux = []
+    
+    with os.scandir(path) as entrees:
+        for entree in entrees:
+            if entree.name.endswith(".zip"):
+                morceaux.append(lire_zip(entree.path))
+            elif entree.name.endswith((".srt", ".txt")):
+                morceaux.append(lire_fichier(entree.path))
+    texte_brut = " " + " ".join(morceaux) if morceaux else ""
+
+    if texte_brut.strip():
+        # Comportement original: ajouter le nom 5 fois pour booster le titre
+        texte_nettoye = nettoyer(((serie_nom + " ") * 5) + texte_brut)
+    else:
+        # NOUVEAU COMPORTEMENT: Inclure le slug de la série comme contenu minimal
+        texte_nettoye = nettoyer(serie_nom) 
+        print(f"ATTENTION: Dossier '{serie_nom}' inclus avec contenu minimal (sous-titres manquants).")
+    return serie_nom, texte_nettoye
+
 def charger_sous_titres(dossier: str) -> Dict[str, str]:
-    """ Loads and cleans subtitles for all series in the folder. """
+    """ Loads and cleans subtitles for all series in the folder, one worker process per core. """
     corpus = {}
     if not os.path.exists(dossier):
         return corpus
 
-    series_list = [d for d in os.listdir(dossier) 
-                   if os.path.isdir(os.path.join(dossier, d)) and not d.startswith(('.', '__'))]
+    # scandir: le type d'entrée vient de readdir, sans un stat() par dossier
+    with os.scandir(dossier) as entrees:
+        series_list = [e.name for e in entrees
+                       if not e.name.startswith(('.', '__')) and e.is_dir()]
     
     total_dossiers = len(series_list)
     print(f"INFO: Attempting to load {total_dossiers} folders...")
     
-    for serie_nom in series_list:
-        path = os.path.join(dossier, serie_nom)
-        texte_brut = ""
-        
-        for f in os.listdir(path):
-            fp = os.path.join(path, f)
-            if f.endswith(".zip"):
-                texte_brut += " " + lire_zip(fp)
-            elif f.endswith((".srt", ".txt")):
-                texte_brut += " " + lire_fichier(fp)
-
-        texte_nettoye = ""
-        if texte_brut.strip():
-            # Comportement original: ajouter le nom 5 fois pour booster le titre
-            texte_nettoye = nettoyer(((serie_nom + " ") * 5) + texte_brut)
-        else:
-            # NOUVEAU COMPORTEMENT: Inclure le slug de la série comme contenu minimal
-            texte_nettoye = nettoyer(serie_nom) 
-            print(f"ATTENTION: Dossier '{serie_nom}' inclus avec contenu minimal (sous-titres manquants).")
-
-        corpus[serie_nom] = texte_nettoye
+    # Lecture + nettoyage (regex sur des textes de plusieurs Mo) liés au CPU: des processus
+    # plutôt que des threads; map() conserve l'ordre des dossiers, donc celui du corpus
+    if series_list:
+        nb_processus = min(os.cpu_count() or 1, total_dossiers)
+        with ProcessPoolExecutor(max_workers=nb_processus) as executor:
+            for serie_nom, texte_nettoye in executor.map(charger_serie, repeat(dossier), series_list, chunksize=4):
+                corpus[serie_nom] = texte_nettoye
             
     print(f"INFO: {len(corpus)} series successfully loaded out of {total_dossiers} found folders.")
     return corpus
 
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """ Indices of the k highest scores, best first: O(n) selection, then a sort of k items only. """
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    indices = np.argpartition(-scores, k - 1)[:k]
+    return indices[np.argsort(-scores[indices], kind='stable')]
+
 # ==============================================================================
 # --- 2. Classe Moteur de Recherche et Recommandation ---
 # ==============================================================================
@@ -105,26 +161,95 @@ def charger_sous_titres(dossier: str) -> Dict[str, str]:
 class Moteur:
     """ Implements the high-precision TF-IDF engine. """
     def __init__(self, corpus: Dict[str, str]):
-        self.corpus = corpus
         self.series = list(corpus.keys()) 
-        self.documents = list(corpus.values())
+        documents = list(corpus.values())
         self.nb_series = len(self.series)
+        self.series_idx = {nom: i for i, nom in enumerate(self.series)}  # slug -> ligne de la matrice
 
         self.vectorizer = TfidfVectorizer(
             max_features=20000, 
             ngram_range=(1, 3), 
             sublinear_tf=True,
-            stop_words=STOP_WORDS_FR_OR_EN 
+            stop_words=STOP_WORDS_FR_OR_EN,
+            dtype=np.float32  # moitié moins d'octets lus par produit scalaire, classement inchangé
         )
-        self.matrice = self.vectorizer.fit_transform(self.documents)
+        self.matrice = self.vectorizer.fit_transform(documents)
+        # Copie par colonnes (termes): le score d'une requête ne lit que les colonnes de ses termes
+        self.matrice_csc = self.matrice.tocsc()
         print("INFO: TF-IDF calculation finished.")
         
-        self.vocabulaire = self.vectorizer.get_feature_names_out()
-        self.idf_map = {term: self.vectorizer.idf_[idx] 
-                        for idx, term in enumerate(self.vocabulaire)}
+        # IDF des termes, indexés par vectorizer.vocabulary_ (pas de dict terme -> idf en double)
+        self.idf_vec = self.vectorizer.idf_
+
+        self.voisins_ids, self.voisins_scores = self._precalculer_voisins()
+
+        # Textes des séries en un seul bloc UTF-8 délimité par bornes_textes (plus d'objet str par série
+        # ni de copie du corpus): seul le bonus IDF contextuel les relit, par recherche de sous-chaîne
+        textes = [document.encode('utf-8') for document in documents]
+        self.bornes_textes = np.cumsum([0] + [len(texte) for texte in textes], dtype=np.int64)
+        self.textes = b"".join(textes)
+        del textes, documents
 
-    def rechercher(self, requete: str, top_k: int) -> List[Tuple[str, float, Dict[str, float]]]:
-        """ High-performance search with hybrid scoring (TF-IDF + Poids IDF + Titre Boost). """
+        # mot -> masque booléen (nb_series,) de `mot in document`, rempli au fil des requêtes (LRU)
+        self._presence_mots = OrderedDict()
+        # Slugs en tableau numpy (recherche de sous-chaîne vectorisée) et séries visées par chaque règle iconique
+        self._slugs = np.array(self.series, dtype=str)
+        self._masques_iconiques = {
+            fragment: np.fromiter((fragment in slug for slug in self.series), dtype=bool, count=self.nb_series)
+            for _, fragment in REGLES_ICONIQUES
+        }
+
+    def _precalculer_voisins(self, taille_bloc: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+        """ Top-NB_VOISINS most similar series for every series, best first (self excluded).
+        Computed once by blocks of rows of matrice @ matrice.T to bound memory. """
+        k = min(NB_VOISINS, self.nb_series - 1)
+        voisins_ids = np.empty((self.nb_series, max(k, 0)), dtype=np.int32)
+        voisins_scores = np.empty((self.nb_series, max(k, 0)), dtype=np.float32)
+        if k <= 0:
+            return voisins_ids, voisins_scores
+        for debut in range(0, self.nb_series, taille_bloc):
+            bloc = (self.matrice[debut:debut + taille_bloc] @ self.matrice.T).toarray()
+            lignes = np.arange(bloc.shape[0])
+            bloc[lignes, debut + lignes] = -1.0  # une série n'est pas sa propre voisine
+            ids = np.argpartition(-bloc, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(bloc, ids, axis=1)
+            ordre = np.argsort(-scores, axis=1, kind='stable')
+            voisins_ids[debut:debut + bloc.shape[0]] = np.take_along_axis(ids, ordre, axis=1)
+            voisins_scores[debut:debut + bloc.shape[0]] = np.take_along_axis(scores, ordre, axis=1)
+        return voisins_ids, voisins_scores
+
+    def _similarites(self, vecteur) -> np.ndarray:
+        """ Cosine of a (1, n_termes) L2-normalized sparse vector against every series.
+        TfidfVectorizer (norm='l2') already normalizes the rows of self.matrice and the
+        query vectors, so a dot product is enough (no per-call re-normalization). Only the
+        columns of the vector's non-zero terms are read, from the CSC copy of the matrix:
+        a query has a handful of terms, while a full SpMV walks every stored coefficient. """
+        return self.matrice_csc[:, vecteur.indices] @ vecteur.data
+
+    def _presence(self, mot: str) -> np.ndarray:
+        """ Boolean mask of the series whose document contains `mot` as a substring.
+        Each word is scanned over the corpus once, then served from an LRU cache of
+        TAILLE_CACHE_PRESENCE words (the least recently used word is evicted first).
+        Matching UTF-8 bytes is equivalent to matching characters (UTF-8 is self-synchronizing). """
+        with _VERROU_PRESENCE:
+            masque = self._presence_mots.get(mot)
+            if masque is not None:
+                self._presence_mots.move_to_end(mot)
+                return masque
+        # Parcours du bloc de textes hors verrou: les autres mots restent servis pendant ce temps
+        motif, textes = mot.encode('utf-8'), self.textes
+        bornes = self.bornes_textes.tolist()
+        masque = np.fromiter((textes.find(motif, debut, fin) != -1 for debut, fin in zip(bornes, bornes[1:])),
+                             dtype=bool, count=self.nb_series)
+        with _VERROU_PRESENCE:
+            self._presence_mots[mot] = masque
+            if len(self._presence_mots) > TAILLE_CACHE_PRESENCE:
+                self._presence_mots.popitem(last=False)
+        return masque
+
+    def rechercher(self, requete: str, top_k: int) -> List[Hit]:
+        """ High-performance search with hybrid scoring (TF-IDF + Poids IDF + Titre Boost).
+        Returns immutable Hit tuples; score, tfidf and couverture are rounded to 4 decimals. """
         requete_nettoyee = nettoyer(requete)
         if not requete_nettoyee:
             return []
@@ -133,21 +258,15 @@ class Moteur:
         mots_enrichis_set = set(mots_requete_originaux)
 
         # Enrichissement bilingue de la requête
-        for mot in mots_requete_originaux:
-            if mot in TRADUCTION_ENRICHISSEMENT:
-                mots_enrichis_set.add(TRADUCTION_ENRICHISSEMENT[mot])
+        mots_enrichis_set.update(TRADUCTION_ENRICHISSEMENT[mot] for mot in mots_enrichis_set & _MOTS_TRADUISIBLES)
         
         requete_enrichie = " ".join(mots_enrichis_set)
         
         # 1. Score TF-IDF (Base de la pertinence)
         vec_requete = self.vectorizer.transform([requete_enrichie])
-        scores_tfidf = cosine_similarity(vec_requete, self.matrice).flatten()
+        scores_tfidf = self._similarites(vec_requete)
 
         # 2. Calcul des Bonus (IDF et Titre)
-        bonus_contexte_idf = np.zeros(self.nb_series)
-        bonus_iconique = np.zeros(self.nb_series)
-        bonus_titre = np.zeros(self.nb_series)
-        
         W_TFIDF = 3.0           
         W_IDF_CONTEXTE = 15.0   
         W_ICONIQUE_BOOST = 5.0  
@@ -155,42 +274,29 @@ class Moteur:
         
         normalisation_mots = len(mots_requete_originaux) if len(mots_requete_originaux) > 0 else 1
 
-        for i in range(self.nb_series):
-            texte = self.documents[i]
-            serie_slug = self.series[i]
-            
-            total_idf_match = 0
-            mots_trouves = 0
-            
-            # --- Score IDF contextuel ---
-            for mot in mots_enrichis_set:
-                if mot in texte:
-                    mots_trouves += 1
-                    idf_value = self.idf_map.get(mot, 1.0) 
-                    total_idf_match += idf_value
-            
-            bonus_contexte_idf[i] = (total_idf_match / normalisation_mots)
-            
-            # --- Boost Titre Direct (Correction pour les noms de série) ---
-            if normalisation_mots >= 1:
-                query_match = ' '.join(mots_requete_originaux)
-                if query_match in serie_slug or serie_slug.startswith(query_match):
-                    bonus_titre[i] = W_TITRE_MATCH * normalisation_mots 
-            
-            # --- Boost Iconique/Sémantique (Garantit les résultats clés) ---
-            if mots_trouves >= (normalisation_mots * 0.75):
-                # Lost / Crash avion île
-                if any(k in mots_requete_originaux for k in ['ile', 'avion', 'crash', 'island', 'plane', 'wreck']) and 'lost' in serie_slug:
-                    bonus_iconique[i] = W_ICONIQUE_BOOST
-                
-                # Breaking Bad / Meth
-                if any(k in mots_requete_originaux for k in ['meth', 'drogue']) and 'breakingbad' in serie_slug:
-                     bonus_iconique[i] = W_ICONIQUE_BOOST
-                
-                # House / Doctor / Hopital
-                if any(k in mots_requete_originaux for k in ['hopital', 'docteur', 'doctor']) and 'house' in serie_slug:
-                     bonus_iconique[i] = W_ICONIQUE_BOOST
+        # Invariants de la requête, calculés une fois plutôt qu'à chaque série
+        mots = list(mots_enrichis_set)
+        ids_mots = np.array([self.vectorizer.vocabulary_.get(mot, -1) for mot in mots], dtype=np.intp)
+        idf_mots = np.where(ids_mots >= 0, self.idf_vec[ids_mots].astype(np.float64), 1.0)  # 1.0 hors vocabulaire
+        query_match = ' '.join(mots_requete_originaux)
+        mots_requete_set = frozenset(mots_requete_originaux)
+        fragments_iconiques = [fragment for mots_cles, fragment in REGLES_ICONIQUES
+                               if not mots_cles.isdisjoint(mots_requete_set)]
+        seuil_iconique = normalisation_mots * 0.75
+
+        # --- Score IDF contextuel: présence (mots x séries) mémorisée par mot ---
+        presence = np.vstack([self._presence(mot) for mot in mots])
+        mots_trouves = presence.sum(axis=0)
+        bonus_contexte_idf = (idf_mots @ presence) / normalisation_mots
 
+        # --- Boost Titre Direct (Correction pour les noms de série) ---
+        bonus_titre = np.where(np.char.find(self._slugs, query_match) >= 0, W_TITRE_MATCH * normalisation_mots, 0.0)
+
+        # --- Boost Iconique/Sémantique (Garantit les résultats clés) ---
+        series_iconiques = np.zeros(self.nb_series, dtype=bool)
+        for fragment in fragments_iconiques:
+            series_iconiques |= self._masques_iconiques[fragment]
+        bonus_iconique = np.where(series_iconiques & (mots_trouves >= seuil_iconique), W_ICONIQUE_BOOST, 0.0)
 
         # 3. Score total (Combinaison pondérée)
         scores = (scores_tfidf * W_TFIDF) + \
@@ -199,34 +305,33 @@ class Moteur:
                  bonus_titre 
                  
 
-        # 4. Tri et formatage
-        indices = scores.argsort()[::-1]
-        resultats = []
+        # 4. Sélection des top_k (argpartition, sans trier tout le corpus) puis seuil,
+        #    arrondis vectorisés sur les seuls résultats retenus
+        indices = top_k_indices(scores, top_k)
+        indices = indices[scores[indices] > 0.001]
+        scores_arrondis = np.round(scores[indices], 4).tolist()
+        tfidf_arrondis = np.round(scores_tfidf[indices].astype(np.float64), 4).tolist()  # float32 -> float64 avant l'arrondi
+        couverture_arrondie = np.round(bonus_contexte_idf[indices], 4).tolist()
         
-        for i in indices:
-            score_final = scores[i]
-            if score_final > 0.001: 
-                details = {
-                    'tfidf': scores_tfidf[i].item(),
-                    'exact': bonus_contexte_idf[i].item(), 
-                    'frequence': 0.0, 
-                    'contexte': bonus_contexte_idf[i].item(), 
-                }
-                resultats.append((self.series[i], score_final.item(), details))
-            
-            if len(resultats) >= top_k:
-                break
-                
-        return resultats
+        # Valeurs déjà arrondies: l'API les renvoie telles quelles
+        series = self.series
+        return [
+            Hit(series[i], score, tfidf, couverture)
+            for i, score, tfidf, couverture in zip(indices.tolist(), scores_arrondis, tfidf_arrondis, couverture_arrondie)
+        ]
 
     def recommander_par_similarite(self, serie_nom: str, top_k: int = 5) -> List[Tuple[str, float]]:
         """ Recommande des séries similaires (par slug). """
-        if serie_nom not in self.corpus: return []
-        try: idx = self.series.index(serie_nom)
-        except ValueError: return [] 
+        idx = self.series_idx.get(serie_nom)
+        if idx is None: return []
+        if top_k <= self.voisins_ids.shape[1]:
+            # Cas courant: simple lecture des voisins précalculés
+            return [(self.series[i], score)
+                    for i, score in zip(self.voisins_ids[idx].tolist(), self.voisins_scores[idx].tolist())
+                    if score > 0.15][:top_k]
         serie_vec = self.matrice[idx]
-        scores_similarite = cosine_similarity(serie_vec, self.matrice).flatten()
-        indices = scores_similarite.argsort()[::-1]
+        scores_similarite = self._similarites(serie_vec)
+        indices = top_k_indices(scores_similarite, top_k + 1)  # +1: la série elle-même
         recommandations = []
         for i in indices:
             if i != idx and scores_similarite[i] > 0.15: 
@@ -236,19 +341,17 @@ class Moteur:
 
     def recommander_par_profil(self, series_aimees: List[str], top_k: int = 5) -> List[Tuple[str, float]]:
         """ Recommande des séries en fonction d'un profil utilisateur (slugs). """
-        vecteurs_series_aimees = []
-        series_aimees_indices = set()
-        for nom in series_aimees:
-            if nom in self.corpus:
-                idx = self.series.index(nom)
-                vecteurs_series_aimees.append(self.matrice[idx])
-                series_aimees_indices.add(idx)
-        if not vecteurs_series_aimees: return []
+        indices_aimees = [self.series_idx[nom] for nom in series_aimees if nom in self.series_idx]
+        if not indices_aimees: return []
+        series_aimees_indices = set(indices_aimees)
         
-        vecteur_profil = sum(vecteurs_series_aimees) / len(vecteurs_series_aimees)
+        # Barycentre des séries aimées, renormalisé: le cosinus devient un seul produit mat-vec
+        vecteur_profil = np.asarray(self.matrice[indices_aimees].mean(axis=0), dtype=np.float32).ravel()
+        norme = np.linalg.norm(vecteur_profil)
+        if norme == 0: return []
         
-        scores_reco = cosine_similarity(vecteur_profil, self.matrice).flatten()
-        indices = scores_reco.argsort()[::-1]
+        scores_reco = self.matrice @ (vecteur_profil / norme)
+        indices = top_k_indices(scores_reco, top_k + len(series_aimees_indices))
         recommandations = []
         for i in indices:
             if i not in series_aimees_indices and scores_reco[i] > 0.15:
@@ -0,0 +1,7 @@
+# Point d'entrée WSGI: gunicorn -c gunicorn.conf.py wsgi:app
+# Importé une seule fois par le maître gunicorn (preload_app): le moteur est chargé
+# avant le fork et partagé en copie-sur-écriture par tous les workers.
+from main import app
+from modules.engine import initialiser_moteur
+
+initialiser_moteur()